@@ -5,9 +5,8 @@ import sys
 
 try:
     from src.bot import main
-    import asyncio
 
-    asyncio.run(main())
+    main()
 except KeyboardInterrupt:
     print("\nBot stopped by user.")
     sys.exit(0)
@@ -1,31 +1,61 @@
+import functools
 import os
+from dataclasses import dataclass
 from pathlib import Path
 
 from dotenv import load_dotenv
 
-module_root = Path(__file__).parent.absolute()
-project_root = module_root.parent.absolute()
-
-load_dotenv(f"{project_root}/.env")
-
-# Configuration
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-GOOGLE_CREDENTIALS_PATH = os.getenv("GOOGLE_CREDENTIALS_PATH", f"{project_root}/credentials.json")
-GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
-TIMEZONE = os.getenv("TIMEZONE", "UTC")
-DATABASE_PATH = os.getenv("DATABASE_PATH", f"{project_root}/meals.db")
-DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
-
-# Webhook configuration (optional - if not set, falls back to polling)
-WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # e.g., "https://example.com"
-WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
-WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
-WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # Optional secret token for webhook security
-
-# Validate required variables
-if not TELEGRAM_BOT_TOKEN:
-    raise ValueError("TELEGRAM_BOT_TOKEN not set in environment variables")
-if not GOOGLE_SHEET_ID:
-    raise ValueError("GOOGLE_SHEET_ID not set in environment variables")
-if not Path(GOOGLE_CREDENTIALS_PATH).exists():
-    raise ValueError(f"Google credentials file not found at {GOOGLE_CREDENTIALS_PATH}")
+module_root = Path(__file__).resolve().parent
+project_root = module_root.parent
+
+
+@dataclass(frozen=True)
+class Config:
+    """Bot configuration read from environment variables"""
+    telegram_bot_token: str
+    google_credentials_path: Path
+    google_sheet_id: str
+    timezone: str
+    database_path: Path
+
+    # Webhook configuration (optional - if webhook_url is not set, falls back to polling)
+    webhook_url: str | None  # e.g., "https://example.com"
+    webhook_port: int
+    webhook_path: str
+    webhook_secret: str | None  # Optional secret token for webhook security
+
+    @property
+    def database_url(self) -> str:
+        return f"sqlite+aiosqlite:///{self.database_path}"
+
+
+@functools.cache
+def load_config() -> Config:
+    """Load configuration from the environment (and .env) and validate it
+
+    The result is cached, so .env is parsed and the credentials file checked
+    only once per process.
+    """
+    load_dotenv(project_root / ".env")
+
+    config = Config(
+        telegram_bot_token=os.getenv("TELEGRAM_BOT_TOKEN"),
+        google_credentials_path=Path(os.getenv("GOOGLE_CREDENTIALS_PATH", project_root / "credentials.json")),
+        google_sheet_id=os.getenv("GOOGLE_SHEET_ID"),
+        timezone=os.getenv("TIMEZONE", "UTC"),
+        database_path=Path(os.getenv("DATABASE_PATH", project_root / "meals.db")),
+        webhook_url=os.getenv("WEBHOOK_URL"),
+        webhook_port=int(os.getenv("WEBHOOK_PORT", "8080")),
+        webhook_path=os.getenv("WEBHOOK_PATH", "/webhook"),
+        webhook_secret=os.getenv("WEBHOOK_SECRET"),
+    )
+
+    # Validate required variables
+    if not config.telegram_bot_token:
+        raise ValueError("TELEGRAM_BOT_TOKEN not set in environment variables")
+    if not config.google_sheet_id:
+        raise ValueError("GOOGLE_SHEET_ID not set in environment variables")
+    if not config.google_credentials_path.exists():
+        raise ValueError(f"Google credentials file not found at {config.google_credentials_path}")
+
+    return config
@@ -1,33 +1,49 @@
-from contextlib import contextmanager
-from datetime import datetime
-from typing import List, Generator
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Date, ForeignKey, UniqueConstraint
-from sqlalchemy.orm import declarative_base, sessionmaker, Session
-from sqlalchemy.exc import IntegrityError
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+import time
+from typing import List, AsyncGenerator
+from sqlalchemy import event, delete, exists, select, Column, Integer, String, DateTime, Date, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import logging
 
-from src.config import DATABASE_URL
-
 logger = logging.getLogger(__name__)
 
+# How long get_meals serves the in-memory meal list before re-reading SQLite
+MEALS_CACHE_TTL = 3600
+
 # SQLAlchemy setup
 Base = declarative_base()
-engine = create_engine(DATABASE_URL, echo=False)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Connection-level SQLite tuning: WAL lets /meals and /view readers proceed
+# while sync_meals writes; busy_timeout is per-connection so it is applied on
+# every connect rather than once at init.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA busy_timeout=30000",
+)
 
-@contextmanager
-def get_db_session() -> Generator[Session, None, None]:
-    """Context manager for database sessions with automatic commit/rollback"""
-    session = SessionLocal()
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply SQLite PRAGMAs to every new DBAPI connection"""
+    cursor = dbapi_connection.cursor()
     try:
-        yield session
-        session.commit()
-    except Exception as e:
-        session.rollback()
-        raise
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
     finally:
-        session.close()
+        cursor.close()
+
+
+def _meal_rows(meals: List[str], synced_at: datetime) -> List[dict]:
+    """Build executemany parameter rows for the meals table"""
+    return [{"name": meal_name, "synced_at": synced_at} for meal_name in meals]
 
 
 class Meal(Base):
@@ -38,6 +54,10 @@ class Meal(Base):
     name = Column(String, unique=True, nullable=False, index=True)
     synced_at = Column(DateTime, nullable=False, default=datetime.now)
 
+    # AUTOINCREMENT keeps ids of pruned meals from being handed to new ones,
+    # so a stale keyboard button can never select a different meal
+    __table_args__ = {"sqlite_autoincrement": True}
+
     def __repr__(self):
         return f"<Meal(id={self.id}, name='{self.name}')>"
 
@@ -47,13 +67,15 @@ class UserMealSelection(Base):
     __tablename__ = "user_meal_selections"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
     meal_id = Column(Integer, ForeignKey("meals.id"), nullable=False)
     selected_date = Column(Date, nullable=False, index=True)
     created_at = Column(DateTime, nullable=False, default=datetime.now)
 
     __table_args__ = (
         UniqueConstraint("user_id", "meal_id", "selected_date", name="unique_user_meal_date"),
+        # Covers get_user_selections: range scan on (user_id, date) yielding meal_id
+        Index("ix_ums_user_date", "user_id", "selected_date", "meal_id"),
     )
 
     def __repr__(self):
@@ -63,106 +85,241 @@ class UserMealSelection(Base):
 class Database:
     """Database operations using SQLAlchemy"""
 
-    def __init__(self):
-        self.init_db()
+    def __init__(self, database_url: str):
+        # Creating the engine does not touch the file; connections open lazily
+        self.engine = create_async_engine(
+            database_url,
+            echo=False,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=8,
+            max_overflow=4,
+            pool_pre_ping=False,
+            # Pooled connections are handed out to whichever thread checks them out;
+            # timeout is the driver-level wait for a lock, matching busy_timeout
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        event.listen(self.engine.sync_engine, "connect", _set_sqlite_pragmas)
+        self.session_factory = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+        # SQLite allows a single writer; serializing writes here avoids waiting
+        # out busy_timeout when sync and user selections collide
+        self._write_lock = asyncio.Lock()
+        self._meals_cache: tuple[tuple[int, str], ...] | None = None
+        self._meals_cache_ts: float = 0
+        # Bumped on every invalidation so a read that overlapped a write
+        # doesn't store its outdated snapshot as fresh
+        self._meals_cache_generation = 0
+
+    @asynccontextmanager
+    async def get_db_session(self, write: bool = False) -> AsyncGenerator[AsyncSession, None]:
+        """Context manager for database sessions with automatic commit/rollback
+
+        Sessions opened with write=True hold the write lock until committed.
+        """
+        if write:
+            await self._write_lock.acquire()
+        session = self.session_factory()
+        try:
+            yield session
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+            if write:
+                self._write_lock.release()
+
+    def _invalidate_meals_cache(self):
+        """Drop the cached meal list after the meals table changes"""
+        self._meals_cache = None
+        self._meals_cache_generation += 1
+
+    @staticmethod
+    def _migrate_meals_autoincrement(connection):
+        """Rebuild a meals table created before ids were AUTOINCREMENT
 
-    def init_db(self):
-        """Initialize database schema"""
+        create_all does not alter existing tables. The table is copied into a
+        new one, keeping ids, then swapped in; selections pointing at ids no
+        longer in meals are dropped so they can't attach to a future meal.
+        """
+        table_sql = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'meals'"
+        ).scalar()
+        if table_sql is None or "AUTOINCREMENT" in table_sql.upper():
+            return
+        logger.info("Migrating meals table to AUTOINCREMENT ids")
+        connection.exec_driver_sql(
+            "CREATE TABLE meals_new ("
+            "id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, "
+            "name VARCHAR NOT NULL, "
+            "synced_at DATETIME NOT NULL)"
+        )
+        connection.exec_driver_sql("INSERT INTO meals_new (id, name, synced_at) SELECT id, name, synced_at FROM meals")
+        connection.exec_driver_sql("DROP TABLE meals")
+        connection.exec_driver_sql("ALTER TABLE meals_new RENAME TO meals")
+        for index in Meal.__table__.indexes:
+            index.create(bind=connection, checkfirst=True)
+        connection.exec_driver_sql(
+            "DELETE FROM user_meal_selections WHERE meal_id NOT IN (SELECT id FROM meals)"
+        )
+
+    @staticmethod
+    def _create_schema(connection):
+        """Create tables and indexes on a synchronous connection"""
+        Base.metadata.create_all(bind=connection)
+        Database._migrate_meals_autoincrement(connection)
+        # create_all skips tables that already exist, so make sure indexes
+        # added after a database was first created are present too
+        for index in UserMealSelection.__table__.indexes:
+            index.create(bind=connection, checkfirst=True)
+        # ix_ums_user_date replaces the old single-column user_id index
+        connection.exec_driver_sql("DROP INDEX IF EXISTS ix_user_meal_selections_user_id")
+
+    async def close(self):
+        """Dispose of the engine's pooled connections"""
+        await self.engine.dispose()
+
+    async def init_db(self):
+        """Initialize database schema, must be awaited before first use"""
         try:
-            Base.metadata.create_all(bind=engine)
+            async with self.engine.begin() as connection:
+                await connection.run_sync(self._create_schema)
             logger.info("Database initialized successfully")
         except Exception as e:
-            logger.error(f"Failed to initialize database: {e}")
+            logger.error("Failed to initialize database: %s", e)
             raise
 
-    def clear_meals(self):
+    async def clear_meals(self):
         """Clear all cached meals"""
         try:
-            with get_db_session() as session:
-                session.query(Meal).delete()
+            async with self.get_db_session(write=True) as session:
+                await session.execute(delete(Meal))
+            self._invalidate_meals_cache()
             logger.info("Cleared all cached meals")
         except Exception as e:
-            logger.error(f"Error clearing meals: {e}")
+            logger.error("Error clearing meals: %s", e)
             raise
 
-    def insert_meals(self, meals: List[str]):
+    async def insert_meals(self, meals: List[str]):
         """Insert meals into database"""
+        if not meals:
+            return
         try:
-            with get_db_session() as session:
+            async with self.get_db_session(write=True) as session:
                 now = datetime.now()
-                for meal_name in meals:
-                    meal = Meal(name=meal_name, synced_at=now)
-                    session.merge(meal)  # Use merge to handle duplicates gracefully
-            logger.info(f"Inserted {len(meals)} meals")
+                # One executemany batch; duplicate names are skipped by the unique index
+                stmt = sqlite_insert(Meal).on_conflict_do_nothing(index_elements=["name"])
+                await session.execute(stmt, _meal_rows(meals, now))
+            self._invalidate_meals_cache()
+            logger.info("Inserted %d meals", len(meals))
         except Exception as e:
-            logger.error(f"Error inserting meals: {e}")
+            logger.error("Error inserting meals: %s", e)
             raise
 
-    def get_meals(self) -> List[tuple]:
-        """Get all cached meals"""
+    async def upsert_meals(self, meals: List[str]):
+        """Upsert synced meals and prune the ones no longer in the sheet
+
+        Existing rows keep their ids, so user selections stay attached to
+        their meals across syncs. Selections of pruned meals are deleted in
+        the same transaction.
+        """
+        if not meals:
+            return
         try:
-            with get_db_session() as session:
-                meals = session.query(Meal.id, Meal.name).order_by(Meal.id).all()
-                return meals
+            async with self.get_db_session(write=True) as session:
+                now = datetime.now()
+                stmt = sqlite_insert(Meal)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["name"],
+                    set_={"synced_at": stmt.excluded.synced_at},
+                )
+                await session.execute(stmt, _meal_rows(meals, now))
+                stale_ids = select(Meal.id).where(Meal.synced_at < now)
+                await session.execute(delete(UserMealSelection).where(UserMealSelection.meal_id.in_(stale_ids)))
+                result = await session.execute(delete(Meal).where(Meal.synced_at < now))
+                removed = result.rowcount
+            self._invalidate_meals_cache()
+            logger.info("Upserted %d meals, removed %d stale meals", len(meals), removed)
         except Exception as e:
-            logger.error(f"Error fetching meals: {e}")
+            logger.error("Error upserting meals: %s", e)
             raise
 
-    def select_meal(self, user_id: int, meal_id: int, selected_date: str) -> bool:
-        """Select a meal for a user on a specific date"""
+    async def get_meals(self) -> tuple[tuple[int, str], ...]:
+        """Get all cached meals, served from memory between syncs"""
+        if self._meals_cache is not None and time.monotonic() - self._meals_cache_ts < MEALS_CACHE_TTL:
+            return self._meals_cache
+        generation = self._meals_cache_generation
         try:
-            # Parse date string to date object
-            from datetime import datetime as dt
-            date_obj = dt.fromisoformat(selected_date).date()
-            
-            with get_db_session() as session:
-                selection = UserMealSelection(
-                    user_id=user_id,
-                    meal_id=meal_id,
-                    selected_date=date_obj,
+            async with self.get_db_session() as session:
+                meals = (await session.execute(select(Meal.id, Meal.name).order_by(Meal.id))).all()
+            meals = tuple((meal_id, name) for meal_id, name in meals)
+            if generation == self._meals_cache_generation:
+                self._meals_cache = meals
+                self._meals_cache_ts = time.monotonic()
+            return meals
+        except Exception as e:
+            logger.error("Error fetching meals: %s", e)
+            raise
+
+    async def select_meal(self, user_id: int, meal_id: int, selected_date: date) -> bool:
+        """Select a meal for a user on a specific date
+
+        Raises ValueError if the meal no longer exists, e.g. a button from a
+        keyboard sent before the meal was pruned.
+        """
+        try:
+            async with self.get_db_session(write=True) as session:
+                # Checked under the write lock, so a sync can't prune the meal in between
+                if not await session.scalar(select(exists().where(Meal.id == meal_id))):
+                    raise ValueError(f"Meal {meal_id} no longer exists")
+                # A duplicate tap hits the unique constraint and inserts nothing
+                stmt = (
+                    sqlite_insert(UserMealSelection)
+                    .values(user_id=user_id, meal_id=meal_id, selected_date=selected_date)
+                    .on_conflict_do_nothing(index_elements=["user_id", "meal_id", "selected_date"])
                 )
-                session.add(selection)
-            logger.info(f"Meal {meal_id} selected by user {user_id} for {selected_date}")
+                result = await session.execute(stmt)
+            if result.rowcount == 0:
+                logger.info("Meal %s already selected by user %s for %s", meal_id, user_id, selected_date)
+                return False
+            logger.info("Meal %s selected by user %s for %s", meal_id, user_id, selected_date)
             return True
-        except IntegrityError as e:
-            logger.warning(f"Meal already selected: {e}")
-            return False
+        except ValueError as e:
+            logger.info("Rejected selection by user %s: %s", user_id, e)
+            raise
         except Exception as e:
-            logger.error(f"Error selecting meal: {e}")
+            logger.error("Error selecting meal: %s", e)
             raise
 
-    def get_user_selections(self, user_id: int, week_start: str) -> List[tuple]:
+    async def get_user_selections(self, user_id: int, week_start: date) -> List[tuple]:
         """Get user's meal selections for a week"""
         try:
-            # Parse date string
-            from datetime import datetime as dt, timedelta
-            week_start_date = dt.fromisoformat(week_start).date()
-            week_end_date = week_start_date + timedelta(days=7)
-            
-            with get_db_session() as session:
-                selections = (
-                    session.query(Meal.name, UserMealSelection.selected_date)
+            week_end = week_start + timedelta(days=7)
+
+            async with self.get_db_session() as session:
+                result = await session.execute(
+                    select(Meal.name, UserMealSelection.selected_date)
                     .join(UserMealSelection, Meal.id == UserMealSelection.meal_id)
-                    .filter(
+                    .where(
                         UserMealSelection.user_id == user_id,
-                        UserMealSelection.selected_date >= week_start_date,
-                        UserMealSelection.selected_date < week_end_date,
+                        UserMealSelection.selected_date >= week_start,
+                        UserMealSelection.selected_date < week_end,
                     )
                     .order_by(UserMealSelection.selected_date)
-                    .all()
                 )
+                selections = result.all()
                 # Convert date objects to isoformat strings for consistency
                 return [(meal_name, selected_date.isoformat()) for meal_name, selected_date in selections]
         except Exception as e:
-            logger.error(f"Error fetching user selections: {e}")
+            logger.error("Error fetching user selections: %s", e)
             raise
 
-    def meal_exists(self) -> bool:
+    async def meal_exists(self) -> bool:
         """Check if any meals are cached"""
         try:
-            with get_db_session() as session:
-                count = session.query(Meal).count()
-                return count > 0
+            async with self.get_db_session() as session:
+                # EXISTS stops at the first row instead of counting the table
+                return bool(await session.scalar(select(exists().select_from(Meal))))
         except Exception as e:
-            logger.error(f"Error checking meal existence: {e}")
+            logger.error("Error checking meal existence: %s", e)
             raise
@@ -0,0 +1,289 @@
+"""Telegram handlers and the meal sync shared by polling and webhook modes"""
+import asyncio
+import logging
+from datetime import date
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.filters.callback_data import CallbackData
+from aiogram.filters.command import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from src.config import Config
+from src.database import Database
+from src.sheets import SheetsClient
+from src.utils import get_current_week_start
+
+logger = logging.getLogger(__name__)
+
+
+VIEW_HEADER = "<b>Your meals for this week:</b>\n\n"
+
+
+class MealCallback(CallbackData, prefix="m"):
+    """Callback data attached to meal selection buttons"""
+    id: int
+
+
+# Define states for conversation
+class AddMealState(StatesGroup):
+    """States for adding a new meal"""
+    waiting_for_meal_name = State()
+
+
+class MealsKeyboard:
+    """/meals keyboard, rebuilt after every sync instead of on every request
+
+    One instance lives in the dispatcher's workflow data next to db, so each
+    dispatcher keeps its own keyboard.
+    """
+
+    def __init__(self):
+        self.markup: InlineKeyboardMarkup | None = None
+        self._lock = asyncio.Lock()
+
+    async def rebuild(self, db: Database) -> InlineKeyboardMarkup | None:
+        """Read the meals and build the selection keyboard for cmd_meals
+
+        The read happens under the lock, so a rebuild that started before a
+        sync can't finish after it and put the old meals back.
+        """
+        async with self._lock:
+            meals = await db.get_meals()
+            if meals:
+                self.markup = InlineKeyboardMarkup(
+                    inline_keyboard=[
+                        [InlineKeyboardButton(text=meal[1], callback_data=MealCallback(id=meal[0]).pack())]
+                        for meal in meals
+                    ]
+                )
+            else:
+                self.markup = None
+            return self.markup
+
+
+async def sync_meals(db: Database, sheets_client: SheetsClient, meals_keyboard: MealsKeyboard):
+    """Sync meals from Google Sheets to database"""
+    try:
+        logger.info("Syncing meals from Google Sheets...")
+        # Always read the sheet: the sync is what picks up edits made there
+        meals = await sheets_client.fetch_meals_async(refresh=True)
+
+        if meals:
+            await db.upsert_meals(meals)
+            await meals_keyboard.rebuild(db)
+            logger.info("Successfully synced %d meals", len(meals))
+        else:
+            logger.warning("No meals fetched from sheet, keeping cached meals")
+    except Exception as e:
+        logger.error("Error syncing meals: %s", e)
+
+
+def schedule_midnight_sync(
+    scheduler: AsyncIOScheduler,
+    db: Database,
+    sheets_client: SheetsClient,
+    meals_keyboard: MealsKeyboard,
+    timezone: str,
+):
+    """Schedule daily meal sync at midnight"""
+    trigger = CronTrigger(hour=0, minute=0, timezone=timezone)
+    scheduler.add_job(
+        sync_meals,
+        trigger=trigger,
+        id="midnight_sync",
+        kwargs={"db": db, "sheets_client": sheets_client, "meals_keyboard": meals_keyboard},
+    )
+    logger.info("Scheduled daily sync at midnight (%s)", timezone)
+
+
+async def on_startup(
+    bot: Bot,
+    dispatcher: Dispatcher,
+    config: Config,
+    db: Database,
+    sheets_client: SheetsClient,
+    scheduler: AsyncIOScheduler,
+    meals_keyboard: MealsKeyboard,
+):
+    logger.info("Bot starting up...")
+    await db.init_db()
+    await sync_meals(db, sheets_client, meals_keyboard)
+
+    if not scheduler.running:
+        scheduler.start()
+        schedule_midnight_sync(scheduler, db, sheets_client, meals_keyboard, config.timezone)
+        logger.info("Scheduler started")
+
+    if config.webhook_url:
+        # Set webhook on Telegram servers
+        webhook_url = f"{config.webhook_url}{config.webhook_path}"
+        await bot.set_webhook(
+            url=webhook_url,
+            secret_token=config.webhook_secret,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
+        logger.info("Webhook set to: %s", webhook_url)
+
+
+async def on_shutdown(db: Database, scheduler: AsyncIOScheduler):
+    """Handle bot shutdown"""
+    logger.info("Bot shutting down...")
+    if scheduler.running:
+        scheduler.shutdown()
+        logger.info("Scheduler stopped")
+    await db.close()
+
+
+async def cmd_start(message: types.Message):
+    """Handle /start command"""
+    try:
+        await message.answer(
+            "Welcome to Meal Planner Bot! 🍽️\n\n"
+            "Use /meals to see available meals and plan your week.\n"
+            "Use /view to see your selected meals for this week.\n"
+            "Use /addmeal to add a new meal to the sheet.",
+            parse_mode="HTML",
+        )
+    except Exception as e:
+        logger.error("Error in /start command: %s", e)
+
+
+async def cmd_addmeal(message: types.Message, state: FSMContext):
+    """Handle /addmeal command - start conversation to add a new meal"""
+    try:
+        await state.set_state(AddMealState.waiting_for_meal_name)
+        await message.answer(
+            "What meal would you like to add? Please enter the meal name:",
+            parse_mode="HTML",
+        )
+    except Exception as e:
+        logger.error("Error in /addmeal command: %s", e)
+        await message.answer("An error occurred. Please try again.")
+
+
+async def process_meal_name(message: types.Message, state: FSMContext, sheets_client: SheetsClient):
+    """Handle meal name input and add to sheet"""
+    try:
+        meal_name = message.text.strip()
+        
+        if not meal_name or len(meal_name) < 2:
+            await message.answer("Please enter a valid meal name (at least 2 characters).")
+            return
+        
+        # Add meal to Google Sheet
+        success = await asyncio.to_thread(sheets_client.add_meal, meal_name)
+        
+        if success:
+            await message.answer(
+                f"✅ Meal '<b>{meal_name}</b>' has been added to the sheet!",
+                parse_mode="HTML",
+            )
+            logger.info("User %s added meal: %s", message.from_user.id, meal_name)
+        else:
+            await message.answer(
+                "❌ Failed to add meal to the sheet. Please try again later.",
+                parse_mode="HTML",
+            )
+        
+        await state.clear()
+    except Exception as e:
+        logger.error("Error processing meal name: %s", e)
+        await message.answer("An error occurred while adding the meal. Please try again.")
+        await state.clear()
+
+
+async def cmd_meals(message: types.Message, db: Database, meals_keyboard: MealsKeyboard):
+    """Handle /meals command - display available meals as buttons"""
+    try:
+        keyboard = meals_keyboard.markup
+        if keyboard is None:
+            keyboard = await meals_keyboard.rebuild(db)
+
+        if keyboard is None:
+            await message.answer("No meals available at the moment. Please try again later.")
+            return
+
+        await message.answer(
+            "Select a meal to plan for this week:",
+            reply_markup=keyboard,
+            parse_mode="HTML",
+        )
+    except Exception as e:
+        logger.error("Error in /meals command: %s", e)
+        await message.answer("An error occurred while fetching meals.")
+
+
+async def cmd_view(message: types.Message, db: Database):
+    """Handle /view command - show user's selected meals for the week"""
+    try:
+        week_start = get_current_week_start()
+        selections = await db.get_user_selections(message.from_user.id, week_start)
+
+        if not selections:
+            await message.answer("You haven't selected any meals for this week yet.")
+            return
+
+        # Format selections by date
+        body = "\n".join(f"<b>{selected_date}:</b> {meal_name}" for meal_name, selected_date in selections)
+        await message.answer(f"{VIEW_HEADER}{body}", parse_mode="HTML")
+    except Exception as e:
+        logger.error("Error in /view command: %s", e)
+        await message.answer("An error occurred while retrieving your selections.")
+
+
+async def process_meal_selection(callback_query: types.CallbackQuery, callback_data: MealCallback, db: Database):
+    """Handle meal button clicks"""
+    try:
+        meal_id = callback_data.id
+        user_id = callback_query.from_user.id
+        today = date.today()
+
+        # Select the meal
+        success = await db.select_meal(user_id, meal_id, today)
+
+        if success:
+            await callback_query.answer("✅ Meal selected for today!", show_alert=False)
+            await callback_query.message.edit_text(
+                "Meal selected for today! Use /view to see all your selections."
+            )
+        else:
+            await callback_query.answer(
+                "⚠️ You already selected a meal for today!", show_alert=True
+            )
+    except ValueError:
+        # The button came from a keyboard sent before the meal was removed from the sheet
+        await callback_query.answer(
+            "This meal is no longer available. Use /meals to see the current list.", show_alert=True
+        )
+    except Exception as e:
+        logger.error("Error processing meal selection: %s", e)
+        await callback_query.answer("An error occurred while selecting the meal.", show_alert=True)
+
+
+def create_router() -> Router:
+    """Create a router with all bot handlers and startup/shutdown hooks
+
+    A router can only be attached to one dispatcher, so a new one is built for
+    every registration. The Bot, Dispatcher and their dependencies (config,
+    db, sheets_client, scheduler, meals_keyboard) are created in src.bot and
+    injected into handlers through the dispatcher's workflow data.
+    """
+    router = Router()
+    router.startup.register(on_startup)
+    router.shutdown.register(on_shutdown)
+    router.message.register(cmd_start, Command("start"))
+    router.message.register(cmd_addmeal, Command("addmeal"))
+    router.message.register(process_meal_name, AddMealState.waiting_for_meal_name)
+    router.message.register(cmd_meals, Command("meals"))
+    router.message.register(cmd_view, Command("view"))
+    router.callback_query.register(process_meal_selection, MealCallback.filter())
+    return router
+
+
+def register(dp: Dispatcher) -> None:
+    """Register all bot handlers and startup/shutdown hooks on the dispatcher"""
+    dp.include_router(create_router())
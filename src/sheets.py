@@ -1,52 +1,155 @@
 
+import google_auth_httplib2
+import httplib2
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+import asyncio
+import functools
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
 from typing import List
 import logging
 
-from src.config import GOOGLE_CREDENTIALS_PATH, GOOGLE_SHEET_ID
+from src.config import load_config
+from src.utils import is_cache_valid
 
 logger = logging.getLogger(__name__)
 
 # Define scopes
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+SCOPES = ("https://www.googleapis.com/auth/spreadsheets",)
+
+# Rate limiting and transient server errors worth retrying for reads
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+# A 5xx on append may arrive after the rows were written, so writes are only
+# retried when the request was rejected outright by rate limiting
+RETRYABLE_WRITE_STATUSES = (429,)
+
+
+def _is_retryable(error: BaseException) -> bool:
+    """Whether a failed Sheets read is worth retrying"""
+    return isinstance(error, HttpError) and error.resp.status in RETRYABLE_STATUSES
+
+
+def _is_write_retryable(error: BaseException) -> bool:
+    """Whether a failed Sheets write is safe to retry without duplicating rows"""
+    return isinstance(error, HttpError) and error.resp.status in RETRYABLE_WRITE_STATUSES
+
+
+@retry(
+    retry=retry_if_exception(_is_retryable),
+    wait=wait_exponential(multiplier=0.5, max=8),
+    stop=stop_after_attempt(5),
+    reraise=True,
+)
+def _execute(request, lock: threading.Lock):
+    """Execute a Sheets API read with bounded exponential backoff
+
+    The lock is held per attempt only, so backoff sleeps don't block other requests.
+    """
+    with lock:
+        return request.execute()
+
+
+@retry(
+    retry=retry_if_exception(_is_write_retryable),
+    wait=wait_exponential(multiplier=0.5, max=8),
+    stop=stop_after_attempt(5),
+    reraise=True,
+)
+def _execute_write(request, lock: threading.Lock):
+    """Execute a non-idempotent Sheets API write, retrying only on rate limiting"""
+    with lock:
+        return request.execute()
+
+
+@functools.cache
+def _load_credentials(credentials_path: Path) -> service_account.Credentials:
+    """Read and parse the service account key once per path and process"""
+    with open(credentials_path) as key_file:
+        key_info = json.load(key_file)
+    return service_account.Credentials.from_service_account_info(key_info, scopes=SCOPES)
 
 
 class SheetsClient:
-    def __init__(self):
+    def __init__(self, credentials_path: Path, sheet_id: str):
+        self.credentials_path = credentials_path
+        self.sheet_id = sheet_id
         self.credentials = self._authenticate()
-        self.service = build("sheets", "v4", credentials=self.credentials)
+        # One authorized transport for the client's lifetime so sequential
+        # requests reuse the same TLS connection instead of reconnecting.
+        # httplib2.Http is not thread-safe and this transport is shared by
+        # every thread using the client, so it is only used under
+        # _request_lock (see _execute)
+        self.http = google_auth_httplib2.AuthorizedHttp(
+            self.credentials, http=httplib2.Http(cache=None, timeout=30)
+        )
+        self._request_lock = threading.Lock()
+        # Use the discovery document bundled with google-api-python-client
+        # instead of fetching it over the network on every client init
+        self.service = build("sheets", "v4", http=self.http, static_discovery=True, cache_discovery=False)
+        # Reuse the spreadsheets.values resource instead of rebuilding it per call
+        self.values = self.service.spreadsheets().values()
+        # Meals fetched today, keyed by (sheet_name, column, max_rows); dropped on the next day
+        self._cache: dict[tuple[str, str, int], List[str]] = {}
+        self._cache_synced_at: str | None = None
+        # fetch_meals and add_meals run in worker threads, so cache access is serialized
+        self._cache_lock = threading.Lock()
+
+    def _cache_is_fresh(self) -> bool:
+        """Whether cached meals were fetched today"""
+        return is_cache_valid(self._cache_synced_at)
+
+    def _store_cached_meals(self, key: tuple[str, str, int], meals: List[str]):
+        """Cache fetched meals, discarding entries from a previous day"""
+        with self._cache_lock:
+            if not self._cache_is_fresh():
+                self._cache.clear()
+                self._cache_synced_at = datetime.now().isoformat()
+            self._cache[key] = meals
 
     def _authenticate(self):
         """Authenticate with Google Sheets API using service account"""
         try:
-            credentials = service_account.Credentials.from_service_account_file(
-                GOOGLE_CREDENTIALS_PATH, scopes=SCOPES
-            )
+            credentials = _load_credentials(Path(self.credentials_path))
             logger.info("Successfully authenticated with Google Sheets API")
             return credentials
         except Exception as e:
-            logger.error(f"Failed to authenticate with Google Sheets: {e}")
+            logger.error("Failed to authenticate with Google Sheets: %s", e)
             raise
 
-    def fetch_meals(self, sheet_name: str = "Sheet1", column: str = "A") -> List[str]:
+    def fetch_meals(
+        self, sheet_name: str = "Sheet1", column: str = "A", max_rows: int = 1000, refresh: bool = False
+    ) -> List[str]:
         """
         Fetch meals from Google Sheet
         
         Args:
             sheet_name: Name of the sheet tab (default: "Sheet1")
             column: Column to fetch meals from (default: "A")
+            max_rows: Last row to read; bounds the range scanned server-side (default: 1000)
+            refresh: Skip today's cache and always read the sheet (default: False)
         
         Returns:
             List of meal names
         """
+        key = (sheet_name, column, max_rows)
+        if not refresh:
+            with self._cache_lock:
+                if self._cache_is_fresh() and key in self._cache:
+                    return list(self._cache[key])
+
         try:
-            range_name = f"{sheet_name}!{column}:{column}"
-            result = (
-                self.service.spreadsheets()
-                .values()
-                .get(spreadsheetId=GOOGLE_SHEET_ID, range=range_name)
-                .execute()
+            range_name = f"{sheet_name}!{column}1:{column}{max_rows}"
+            # Partial response with only the cell values; COLUMNS returns the
+            # single column as one flat list instead of one list per row
+            result = _execute(
+                self.values
+                .get(spreadsheetId=self.sheet_id, range=range_name, fields="values", majorDimension="COLUMNS"),
+                self._request_lock,
             )
 
             values = result.get("values", [])
@@ -54,15 +157,28 @@ class SheetsClient:
                 logger.warning("No meals found in sheet")
                 return []
 
-            # Flatten the list and filter out empty values
-            meals = [meal[0].strip() for meal in values if meal and meal[0].strip()]
-            logger.info(f"Fetched {len(meals)} meals from Google Sheet")
-            return meals
+            # Filter out empty cells of the single returned column, stripping each once
+            meals = [stripped for meal in values[0] if meal and (stripped := meal.strip())]
+            # sync_meals logs the INFO summary for each sync; this is detail
+            logger.debug("Fetched %d meals from Google Sheet", len(meals))
+            self._store_cached_meals(key, meals)
+            return list(meals)
 
         except Exception as e:
-            logger.error(f"Failed to fetch meals from Google Sheet: {e}")
+            logger.error("Failed to fetch meals from Google Sheet: %s", e)
             raise
 
+    async def fetch_meals_async(
+        self, sheet_name: str = "Sheet1", column: str = "A", max_rows: int = 1000, refresh: bool = False
+    ) -> List[str]:
+        """
+        Fetch meals without blocking the event loop
+        
+        Runs fetch_meals in a worker thread; see fetch_meals for arguments.
+        The bot calls it only from sync_meals (startup and the midnight job).
+        """
+        return await asyncio.to_thread(self.fetch_meals, sheet_name, column, max_rows, refresh)
+
     def add_meal(self, meal_name: str, sheet_name: str = "Sheet1", column: str = "A") -> bool:
         """
         Add a new meal to Google Sheet
@@ -75,31 +191,61 @@ class SheetsClient:
         Returns:
             True if successful, False otherwise
         """
+        return self.add_meals([meal_name], sheet_name, column)
+
+    def add_meals(self, meal_names: List[str], sheet_name: str = "Sheet1", column: str = "A") -> bool:
+        """
+        Add several meals to Google Sheet in a single request
+        
+        Args:
+            meal_names: Names of the meals to add
+            sheet_name: Name of the sheet tab (default: "Sheet1")
+            column: Column to add meals to (default: "A")
+        
+        Returns:
+            True if successful, False otherwise
+        """
+        if not meal_names:
+            return True
         try:
-            # Get the next available row
+            # append finds the end of the column's data server-side, so no
+            # separate read is needed to locate the next free row
             range_name = f"{sheet_name}!{column}:{column}"
-            result = (
-                self.service.spreadsheets()
-                .values()
-                .get(spreadsheetId=GOOGLE_SHEET_ID, range=range_name)
-                .execute()
-            )
-            
-            values = result.get("values", [])
-            next_row = len(values) + 1
-            
-            # Append the meal to the next row
-            append_range = f"{sheet_name}!{column}{next_row}"
-            self.service.spreadsheets().values().update(
-                spreadsheetId=GOOGLE_SHEET_ID,
-                range=append_range,
+            _execute_write(self.values.append(
+                spreadsheetId=self.sheet_id,
+                range=range_name,
                 valueInputOption="RAW",
-                body={"values": [[meal_name.strip()]]}
-            ).execute()
+                insertDataOption="INSERT_ROWS",
+                body={"values": [[meal_name.strip()] for meal_name in meal_names]}
+            ), self._request_lock)
             
-            logger.info(f"Successfully added meal '{meal_name}' to Google Sheet")
+            # Write through to today's cache so the next fetch sees the new rows
+            with self._cache_lock:
+                if self._cache_is_fresh():
+                    for (cached_sheet, cached_column, _), cached in self._cache.items():
+                        if (cached_sheet, cached_column) == (sheet_name, column):
+                            cached.extend(meal_name.strip() for meal_name in meal_names)
+
+            logger.info("Successfully added %d meal(s) to Google Sheet", len(meal_names))
             return True
             
         except Exception as e:
-            logger.error(f"Failed to add meal to Google Sheet: {e}")
+            logger.error("Failed to add meals to Google Sheet: %s", e)
             return False
+
+
+_client: SheetsClient | None = None
+
+
+def get_client() -> SheetsClient:
+    """Return the process-wide SheetsClient, creating it on first use
+
+    Authentication and service discovery then happen once per process. The
+    client's HTTP transport is shared process-wide; SheetsClient serializes
+    requests on it, so the client is safe to call from worker threads.
+    """
+    global _client
+    if _client is None:
+        config = load_config()
+        _client = SheetsClient(config.google_credentials_path, config.google_sheet_id)
+    return _client
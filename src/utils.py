@@ -1,35 +1,51 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Today's date, recomputed at most once per second
+_TODAY_CACHE = {"t": 0.0, "d": None}
 
-def get_current_week_start() -> str:
+
+def _today() -> date:
+    """Get today's date, memoized for about a second
+
+    Handlers that call several helpers per update share one clock read; the
+    value can lag a date change by up to a second, so it is only used for
+    display helpers, never for cache validity.
+    """
+    now = time.monotonic()
+    if _TODAY_CACHE["d"] is None or now - _TODAY_CACHE["t"] > 1.0:
+        _TODAY_CACHE["d"] = datetime.now().date()
+        _TODAY_CACHE["t"] = now
+    return _TODAY_CACHE["d"]
+
+
+def get_current_week_start() -> date:
     """Get the start of the current week (Monday)"""
-    today = datetime.now().date()
+    today = _today()
     # Monday is 0, Sunday is 6
     days_since_monday = today.weekday()
-    week_start = today - timedelta(days=days_since_monday)
-    return week_start.isoformat()
+    return today - timedelta(days=days_since_monday)
 
 
 def get_week_days() -> list[str]:
     """Get all days of the current week (Monday to Sunday)"""
-    week_start = get_current_week_start()
-    start_date = datetime.fromisoformat(week_start).date()
-    days = []
-    for i in range(7):
-        day = start_date + timedelta(days=i)
-        days.append(day.isoformat())
-    return days
+    start_date = get_current_week_start()
+    return [(start_date + timedelta(days=i)).isoformat() for i in range(7)]
 
 
-def is_cache_valid(synced_at_iso: str) -> bool:
+def is_cache_valid(synced_at_iso: str | None) -> bool:
     """Check if cache is still valid (same day)"""
+    # Nothing synced yet is the normal first-run case, not an error
+    if not synced_at_iso:
+        return False
     try:
-        synced_date = datetime.fromisoformat(synced_at_iso).date()
-        today = datetime.now().date()
-        return synced_date == today
-    except Exception as e:
-        logger.error(f"Error checking cache validity: {e}")
+        # Only the date part matters; skip parsing the time component. Read
+        # the real clock here: the memoized _today() may still report
+        # yesterday just after midnight
+        return date.fromisoformat(synced_at_iso[:10]) == datetime.now().date()
+    except ValueError as e:
+        logger.debug("Invalid cache timestamp %r: %s", synced_at_iso, e)
         return False